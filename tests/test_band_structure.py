@@ -0,0 +1,179 @@
+import unittest
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+from phonopy import Phonopy
+from phonopy.interface.vasp import read_vasp
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.harmonic.dynamical_matrix import DynamicalMatrix
+from upho.phonon.band_structure import BandStructure
+from upho.phonon.density_extractor import DensityExtractorText
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+class TestBandStructure(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        unitcell = read_vasp(os.path.join(DATA_DIR, 'POSCAR'))
+        phonon = Phonopy(unitcell, np.eye(3, dtype=int) * 2)
+        phonon.set_displacement_dataset(
+            parse_FORCE_SETS(filename=os.path.join(DATA_DIR, 'FORCE_SETS')))
+        phonon.produce_force_constants()
+        cls._dynamical_matrix = DynamicalMatrix(
+            phonon.get_supercell(),
+            phonon.get_primitive(),
+            phonon.get_force_constants())
+        cls._unitcell_ideal = read_vasp(os.path.join(DATA_DIR, 'POSCAR_ideal'))
+        cls._primitive_matrix_ideal = np.array([
+            [0.0, 0.5, 0.5],
+            [0.5, 0.0, 0.5],
+            [0.5, 0.5, 0.0],
+        ])
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _create_band_structure(self, paths, **kwargs):
+        return BandStructure(
+            paths,
+            self._dynamical_matrix,
+            self._unitcell_ideal,
+            self._primitive_matrix_ideal,
+            **kwargs)
+
+    def _run(self, paths, filename, **kwargs):
+        filename = os.path.join(self._tmpdir, filename)
+        self._create_band_structure(paths, **kwargs).run(filename)
+        return filename
+
+    def test_nprocs(self):
+        paths = [np.linspace([0.0, 0.0, 0.0], [0.0, 0.5, 0.5], 3)]
+        for nprocs in [0, -1]:
+            with self.assertRaises(ValueError):
+                self._create_band_structure(paths, nprocs=nprocs)
+
+    def test_distances(self):
+        paths = [
+            np.linspace([0.0, 0.0, 0.0], [0.0, 0.5, 0.5], 11),
+            np.linspace([1.0, 0.5, 0.5], [0.0, 0.0, 0.0], 11),
+            np.linspace([0.0, 0.0, 0.0], [0.5, 0.5, 0.5], 11),
+        ]
+        band_structure = self._create_band_structure(paths)
+
+        # Accumulate distances q-point by q-point
+        reciprocal_lattice = np.linalg.inv(
+            band_structure._cell.get_cell()).T
+        distances = []
+        special_point = [0.0]
+        distance = 0.0
+        for path in paths:
+            lastq = path[0]
+            distances_path = []
+            for q in path:
+                distance += np.linalg.norm(
+                    np.dot(q - lastq, reciprocal_lattice))
+                lastq = q
+                distances_path.append(distance)
+            distances.append(distances_path)
+            special_point.append(distance)
+
+        np.testing.assert_array_equal(band_structure.get_paths(), paths)
+        self.assertTrue(np.allclose(band_structure._distances, distances))
+        self.assertTrue(np.allclose(
+            band_structure._special_point, special_point))
+
+    def test_pool(self):
+        paths = [
+            np.linspace([0.0, 0.0, 0.0], [0.0, 0.5, 0.5], 4),
+            np.linspace([0.0, 0.5, 0.5], [0.5, 0.5, 0.5], 4),
+        ]
+        filename_serial = self._run(paths, 'band_serial.hdf5', star='sym')
+        filename_pool = self._run(
+            paths, 'band_pool.hdf5', star='sym', nprocs=2)
+
+        with h5py.File(filename_serial, 'r') as fs, \
+                h5py.File(filename_pool, 'r') as fp:
+            for ipath, path in enumerate(paths):
+                for ip in range(len(path)):
+                    group = '{}/{}/'.format(ipath, ip)
+                    self.assertEqual(set(fs[group]), set(fp[group]))
+                    for k in fs[group]:
+                        np.testing.assert_array_equal(
+                            fs[group + k][()], fp[group + k][()])
+
+    def test_store_eigenvectors(self):
+        paths = [np.linspace([0.0, 0.0, 0.0], [0.0, 0.25, 0.25], 2)]
+        filename = self._run(paths, 'band.hdf5', is_eigenvectors=True)
+        with h5py.File(filename, 'r') as f:
+            self.assertNotIn('eigenvectors', f['0/1'])
+
+        filename = self._run(paths, 'band.hdf5', store_eigenvectors=True)
+        with h5py.File(filename, 'r') as f:
+            nbands = f['0/1/frequencies'].shape[-1]
+            self.assertEqual(
+                f['0/1/eigenvectors'].shape, (1, nbands, nbands))
+
+    def _extract_spectral_functions(self, filename, group):
+        """Return the labels and the values except distances in text files"""
+        cwd = os.getcwd()
+        os.chdir(self._tmpdir)
+        try:
+            DensityExtractorText(
+                filename=filename, fmax=10.0, sigma=0.5, group=group)
+            spectral_functions = {}
+            for fn in ['sf_SR.dat', 'sf_E1.dat', 'sf_E2.dat']:
+                with open(fn) as f:
+                    labels = f.readlines()[4].split()
+                values = np.loadtxt(fn)[:, 1:]
+                spectral_functions[fn] = labels, values
+        finally:
+            os.chdir(cwd)
+        return spectral_functions
+
+    def test_link_solved_group(self):
+        # (0, x, x) and (x, 0, x) are equivalent for "sym" and "all", and
+        # Gamma is repeated.
+        paths = [
+            np.linspace([0.0, 0.0, 0.0], [0.0, 0.25, 0.25], 3),
+            np.linspace([0.0, 0.0, 0.0], [0.25, 0.0, 0.25], 3),
+        ]
+        for star in ['sym', 'all']:
+            filename = self._run(paths, 'band.hdf5', star=star)
+
+            with h5py.File(filename, 'r') as f:
+                for ip, q in enumerate(paths[1]):
+                    group_solved = '0/{}/'.format(ip)
+                    group = '1/{}/'.format(ip)
+                    np.testing.assert_array_equal(f[group + 'point'][()], q)
+                    np.testing.assert_array_equal(
+                        f[group_solved + 'point'][()], paths[0][ip])
+                    for k in f[group_solved]:
+                        if k in ('point', 'distance'):
+                            continue
+                        # Hard links to the same dataset
+                        self.assertEqual(f[group + k], f[group_solved + k])
+
+            # Solve the q-points of the linked groups without linking.
+            # Arms are in different orders, so spectral functions are
+            # compared instead of the raw data.
+            filename_direct = self._run(
+                paths[1:], 'band_direct.hdf5', star=star)
+            for ip in range(len(paths[1])):
+                sf = self._extract_spectral_functions(
+                    filename, '1/{}/'.format(ip))
+                sf_direct = self._extract_spectral_functions(
+                    filename_direct, '0/{}/'.format(ip))
+                for fn, (labels, values) in sf.items():
+                    labels_direct, values_direct = sf_direct[fn]
+                    self.assertEqual(labels, labels_direct)
+                    self.assertTrue(np.allclose(values, values_direct), fn)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+from upho.phonon.eigenstates import write_data_hdf5
+from upho.phonon.density_extractor import (
+    DensityExtractorText, square_frequencies)
+
+
+def write_lines(distance, frequencies, sf_total, values):
+    """Write spectral functions value by value"""
+    text = ''
+    for i, frequency in enumerate(frequencies):
+        text += '{:12.6f}'.format(distance)
+        text += '{:12.6f}'.format(frequency)
+        text += '{:12.6f}'.format(sf_total[i])
+        for v in values[i]:
+            text += '{:12.6f}'.format(float(v))
+        text += '\n'
+    text += '\n'
+    return text
+
+
+class TestDensityExtractorText(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmpdir = tempfile.mkdtemp()
+        os.chdir(self._tmpdir)
+
+        rng = np.random.RandomState(0)
+        narms, nirreps, natoms_p, nbands = 2, 3, 2, 12
+        self._elements = ['Cu', 'Au', 'Pd']
+        ne = len(self._elements)
+        shape_e = (narms, natoms_p, ne, natoms_p, ne, nbands)
+        self._data = {
+            'distance': 0.5,
+            'elements': self._elements,
+            'ir_labels': ['A1', 'E', 'T2'],
+            'frequencies': rng.rand(narms, nbands) * 3.0,
+            'weights_t': rng.rand(narms, nbands),
+            'weights_e': rng.rand(*shape_e) + 1j * rng.rand(*shape_e),
+            'weights_s': rng.rand(narms, nirreps, nbands),
+            'weights_s_e': rng.rand(
+                narms, nirreps, natoms_p, ne, natoms_p, ne, nbands),
+            'weights_e2': rng.rand(narms, natoms_p, ne, nbands),
+        }
+        with h5py.File('band.hdf5', 'w') as f:
+            f.create_dataset('paths', data=np.zeros((1, 1, 3)))
+            write_data_hdf5(f, self._data, group='0/0/')
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmpdir)
+
+    def _read_blocks(self, filename):
+        """Return the labels and the values written after the header"""
+        with open(filename) as f:
+            lines = f.readlines()[4:]
+        return lines[0], ''.join(lines[1:])
+
+    def _get_weights(self):
+        data = self._data
+        return {
+            'total': data['weights_t'],
+            'E1': data['weights_e'],
+            'SR': data['weights_s'],
+            'SR_E1': data['weights_s_e'],
+            'E2': data['weights_e2'],
+        }
+
+    def test_calculate_spectral_functions(self):
+        extractor = DensityExtractorText(
+            filename='band.hdf5', fmax=4.0, sigma=0.5, group='0/0/')
+
+        energies = square_frequencies(self._data['frequencies'])
+        weights = self._get_weights()
+        for is_SR_E1 in [True, False]:
+            sf = extractor.calculate_spectral_functions(
+                energies, weights, is_SR_E1=is_SR_E1)
+            keys = set(weights)
+            if not is_SR_E1:
+                keys.remove('SR_E1')
+            self.assertEqual(set(sf), keys)
+            for k in keys:
+                self.assertTrue(np.allclose(
+                    sf[k], extractor.calculate_density(energies, weights[k])))
+
+    def test_write(self):
+        extractor = DensityExtractorText(
+            filename='band.hdf5', fmax=4.0, sigma=0.5, group='0/0/')
+
+        data = self._data
+        energies = square_frequencies(data['frequencies'])
+        weights = self._get_weights()
+        sf = extractor.calculate_spectral_functions(energies, weights)
+        frequencies = extractor.get_evaluated_energies()
+        distance = data['distance']
+        elements = self._elements
+        ne = len(elements)
+
+        labels, text = self._read_blocks('sf_SR.dat')
+        self.assertEqual(labels.split()[-3:], data['ir_labels'])
+        self.assertEqual(
+            text, write_lines(distance, frequencies, sf['total'], sf['SR']))
+
+        labels, text = self._read_blocks('sf_E1.dat')
+        values = []
+        labels_e1 = []
+        for ie in range(ne):
+            for je in range(ie, ne):
+                labels_e1.append(elements[ie] + '-' + elements[je])
+        for i in range(len(frequencies)):
+            values.append([])
+            for ie in range(ne):
+                for je in range(ie, ne):
+                    if ie == je:
+                        v = np.real(np.sum(sf['E1'][i, :, ie, :, je]))
+                    else:
+                        v = np.real(
+                            np.sum(sf['E1'][i, :, ie, :, je]) +
+                            np.sum(sf['E1'][i, :, je, :, ie])
+                        )
+                    values[i].append(v)
+        self.assertEqual(labels.split()[-len(labels_e1):], labels_e1)
+        self.assertEqual(
+            text, write_lines(distance, frequencies, sf['total'], values))
+
+        labels, text = self._read_blocks('sf_E2.dat')
+        values = [[np.sum(sf['E2'][i, :, ie]) for ie in range(ne)]
+                  for i in range(len(frequencies))]
+        self.assertEqual(labels.split()[-ne:], elements)
+        self.assertEqual(
+            text, write_lines(distance, frequencies, sf['total'], values))
+
+
+if __name__ == "__main__":
+    unittest.main()
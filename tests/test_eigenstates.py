@@ -0,0 +1,140 @@
+import unittest
+import os
+import h5py
+import numpy as np
+from phonopy.interface.vasp import read_vasp
+from upho.phonon.eigenstates import Eigenstates, write_data_hdf5
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+class ModelDynamicalMatrix(object):
+    """D(q) = A + B exp(2 pi i q.R) + B^T exp(-2 pi i q.R) with real A, B
+
+    Since A and B are real, D(-q) = D(q)^* as for real force constants.
+    """
+    def __init__(self, primitive, lattice_vector=(1, 0, 0), seed=0):
+        n = primitive.get_number_of_atoms() * 3
+        rng = np.random.RandomState(seed)
+        a = rng.rand(n, n)
+        self._a = a + a.T
+        self._b = rng.rand(n, n)
+        self._lattice_vector = np.array(lattice_vector)
+        self._primitive = primitive
+        self._num_solved = 0
+
+    def get_primitive(self):
+        return self._primitive
+
+    def is_nac(self):
+        return False
+
+    def set_dynamical_matrix(self, q):
+        phase = np.exp(2.0j * np.pi * np.dot(q, self._lattice_vector))
+        self._dynamical_matrix = (
+            self._a + self._b * phase + self._b.T * np.conj(phase))
+        self._num_solved += 1
+
+    def get_dynamical_matrix(self):
+        return self._dynamical_matrix
+
+    def get_num_solved(self):
+        return self._num_solved
+
+
+class TestEigenstates(unittest.TestCase):
+    def _create_eigenstates(self, star):
+        unitcell = read_vasp(os.path.join(DATA_DIR, 'POSCAR'))
+        unitcell_ideal = read_vasp(os.path.join(DATA_DIR, 'POSCAR_ideal'))
+        primitive_matrix_ideal = np.array([
+            [0.0, 0.5, 0.5],
+            [0.5, 0.0, 0.5],
+            [0.5, 0.5, 0.0],
+        ])
+        dynamical_matrix = ModelDynamicalMatrix(unitcell)
+        eigenstates = Eigenstates(
+            dynamical_matrix,
+            unitcell_ideal,
+            primitive_matrix_ideal,
+            star=star)
+        return eigenstates, dynamical_matrix
+
+    def test_reuse_eigensolutions(self):
+        q = np.array([0.1, 0.2, 0.3])
+        for star in ['none', 'sym']:
+            eigenstates, dynamical_matrix = self._create_eigenstates(star)
+            eigenstates.extract_eigenstates(q)
+            # For "sym", arms at -q reuse the eigensolutions at q.
+            narms = eigenstates.get_narms()
+            num_solved = 1 if star == 'none' else narms // 2
+            self.assertEqual(dynamical_matrix.get_num_solved(), num_solved)
+            self.assertEqual(eigenstates._eigensolutions, {})
+            self.assertEqual(eigenstates._num_reuses, {})
+
+        # Only eigensolutions reused later are kept.
+        eigenstates, dynamical_matrix = self._create_eigenstates('none')
+        eigenstates._num_reuses = {}
+        eigenstates._solve_eigenproblem(q)
+        self.assertEqual(eigenstates._eigensolutions, {})
+
+    def test_time_reversal(self):
+        q = np.array([0.1, 0.2, 0.3])
+
+        eigenstates, dynamical_matrix = self._create_eigenstates('sym')
+        eigenstates.set_distance(0.0)
+        eigenstates.extract_eigenstates(q)
+        data = eigenstates.get_data()
+
+        # Solve eigenproblems at all the arms directly
+        eigenstates_direct, dynamical_matrix_direct = (
+            self._create_eigenstates('sym'))
+        eigenstates_direct._count_reuses = lambda q_star: {}
+        eigenstates_direct.set_distance(0.0)
+        eigenstates_direct.extract_eigenstates(q)
+        data_direct = eigenstates_direct.get_data()
+
+        narms = eigenstates.get_narms()
+        self.assertEqual(dynamical_matrix.get_num_solved(), narms // 2)
+        self.assertEqual(dynamical_matrix_direct.get_num_solved(), narms)
+
+        np.testing.assert_array_equal(data['q_star'], data_direct['q_star'])
+        keys = [
+            'frequencies',
+            'weights_t',
+            'weights_e',
+            'weights_s',
+            'weights_s_e',
+            'weights_e2',
+        ]
+        for k in keys:
+            self.assertTrue(np.allclose(data[k], data_direct[k]), k)
+
+    def test_write_data_hdf5(self):
+        data = {
+            'point': np.array([0.0, 0.25, 0.25]),
+            'q_star': np.random.rand(6, 3),
+            'num_arms': 6,
+            'elements': ['Cu', 'Au'],
+            'pointgroup_symbol': 'mmm',
+            'weights_s_e': np.random.rand(6, 10, 4, 2, 4, 2, 12) + 0j,
+        }
+        with h5py.File('tmp.hdf5', 'w', driver='core',
+                       backing_store=False) as f:
+            write_data_hdf5(f, data, group='0/0/')
+
+            self.assertIsNone(f['0/0/q_star'].chunks)
+            self.assertIsNone(f['0/0/q_star'].compression)
+            self.assertIsNotNone(f['0/0/weights_s_e'].chunks)
+            self.assertEqual(f['0/0/weights_s_e'].compression, 'gzip')
+
+            for k in ['point', 'q_star', 'num_arms', 'weights_s_e']:
+                np.testing.assert_array_equal(f['0/0/' + k][()], data[k])
+            self.assertEqual(
+                list(f['0/0/elements'].asstr()[()]), data['elements'])
+            self.assertEqual(
+                f['0/0/pointgroup_symbol'].asstr()[()],
+                data['pointgroup_symbol'])
+
+
+if __name__ == "__main__":
+    unittest.main()
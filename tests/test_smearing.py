@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from upho.analysis.functions import lorentzian
+from upho.analysis.smearing import (
+    Smearing, gaussian, gaussian_kernel, histogram, numba)
+
+
+class TestSmearing(unittest.TestCase):
+    def setUp(self):
+        self._peaks = np.array([-1.0, 0.5, 2.0, 3.5])
+        self._weights = np.random.rand(3, 2, len(self._peaks))
+
+    def test_create_kernel(self):
+        smearing_functions = {
+            'gaussian': gaussian,
+            'lorentzian': lorentzian,
+            'histogram': histogram,
+        }
+        sigma = 0.2
+        for function_name, smearing_function in smearing_functions.items():
+            smearing = Smearing(function_name=function_name, sigma=sigma)
+            smearing.build_xs(-2.0, 5.0, 0.1)
+            xs = smearing.get_xs()
+
+            kernel = smearing.create_kernel(self._peaks)
+            kernel_expected = smearing_function(
+                xs[:, None], self._peaks[None, :], sigma)
+            self.assertEqual(kernel.shape, (len(xs), len(self._peaks)))
+            self.assertTrue(np.allclose(kernel, kernel_expected))
+
+            self.assertTrue(np.allclose(
+                smearing.run(self._peaks, self._weights),
+                np.inner(kernel_expected, self._weights)))
+            self.assertTrue(np.allclose(
+                smearing.run(self._peaks),
+                np.sum(kernel_expected, axis=1)))
+
+    @unittest.skipIf(numba is None, "Numba is not available")
+    def test_gaussian_kernel(self):
+        sigma = 0.2
+        xs = np.linspace(-2.0, 5.0, 71)
+        kernel = gaussian_kernel(xs, self._peaks, sigma)
+        self.assertTrue(np.allclose(
+            kernel, gaussian(xs[:, None], self._peaks[None, :], sigma),
+            rtol=1e-12, atol=0.0))
+
+        # Integer and non-contiguous peaks are cast in create_kernel.
+        smearing = Smearing(function_name='gaussian', sigma=sigma)
+        smearing.set_xs(xs)
+        peaks_list = [
+            np.array([-1, 0, 2, 3]),
+            np.array([[-1.0, 7.0], [0.5, 7.0], [2.0, 7.0]])[:, 0],
+        ]
+        for peaks in peaks_list:
+            self.assertTrue(np.allclose(
+                smearing.create_kernel(peaks),
+                gaussian(xs[:, None], peaks[None, :], sigma),
+                rtol=1e-12, atol=0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,12 +7,39 @@ __author__ = "Yuji Ikeda"
 import numpy as np
 from .functions import lorentzian
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 
 def gaussian(x, mu, sigma):
     tmp = np.exp(- (x - mu) ** 2 / (2.0 * sigma ** 2))
     return 1.0 / np.sqrt(2.0 * np.pi) / sigma * tmp
 
 
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def gaussian_kernel(xs, peaks, sigma):
+        """Same as gaussian(xs[:, None], peaks[None, :], sigma)
+
+        This is compiled by Numba when it is available and avoids the
+        temporary (len(xs), len(peaks)) arrays created by NumPy.
+        """
+        nxs = xs.shape[0]
+        npeaks = peaks.shape[0]
+        factor = 1.0 / np.sqrt(2.0 * np.pi) / sigma
+        alpha = 1.0 / (2.0 * sigma ** 2)
+        kernel = np.empty((nxs, npeaks))
+        for i in numba.prange(nxs):
+            for j in range(npeaks):
+                d = xs[i] - peaks[j]
+                kernel[i, j] = factor * np.exp(- d * d * alpha)
+        return kernel
+else:
+    gaussian_kernel = None
+
+
 def histogram_old(x, positions, width):
     tmp = np.zeros((x.shape[0], positions.shape[-1]))
     x_tmp = np.zeros(x.shape[0] + 1)
@@ -90,6 +117,28 @@ class Smearing(object):
     def get_function_name(self):
         return self._function_name
 
+    def create_kernel(self, peaks):
+        """Get smeared peaks evaluated at xs without weights.
+
+        Args:
+            peaks:
+
+        Returns:
+            kernel: (len(xs), len(peaks)) array
+                This can be shared among different weights for "peaks".
+        """
+        smearing_function = self._smearing_function
+        xs = self._xs
+        sigma = self._sigma
+
+        if smearing_function is gaussian and gaussian_kernel is not None:
+            return gaussian_kernel(
+                np.ascontiguousarray(xs, dtype='double'),
+                np.ascontiguousarray(peaks, dtype='double'),
+                float(sigma))
+
+        return smearing_function(xs[:, None], peaks[None, :], sigma)
+
     def run(self, peaks, weights=None):
         """Get smeared values.
 
@@ -100,11 +149,7 @@ class Smearing(object):
                 Now this can be one-dimeansional and multi-dimensional arrays.
                 The last dimension must have the same order as the "peaks".
         """
-        smearing_function = self._smearing_function
-        xs = self._xs
-        sigma = self._sigma
-
-        tmp = smearing_function(xs[:, None], peaks[None, :], sigma)
+        tmp = self.create_kernel(peaks)
         if weights is not None:
             values = np.inner(tmp, weights)
         else:
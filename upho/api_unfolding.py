@@ -131,7 +131,8 @@ class PhonopyUnfolding(Phonopy):
     def set_band_structure(self,
                            bands,
                            is_eigenvectors=False,
-                           is_band_connection=False):
+                           is_band_connection=False,
+                           nprocs=1):
         if self._dynamical_matrix is None:
             print("Warning: Dynamical matrix has not yet built.")
             self._band_structure = None
@@ -148,7 +149,9 @@ class PhonopyUnfolding(Phonopy):
             factor=self._factor,
             star=self._star,
             mode=self._mode,
+            nprocs=nprocs,
             verbose=True)
+        self._band_structure.run()
         return True
 
     # Sampling mesh
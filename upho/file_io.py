@@ -39,6 +39,16 @@ def read_band_hdf5(hdf5_file="band.hdf5"):
     return band_data
 
 
+def decode_string(value, encoding='ascii'):
+    """Decode a string read from HDF5
+
+    Depending on the h5py version, strings are read as bytes or str.
+    """
+    if isinstance(value, bytes):
+        return value.decode(encoding)
+    return value
+
+
 def read_input(filename_input):
     import yaml
     with open(filename_input, 'r') as f:
@@ -2,14 +2,35 @@
 # -*- coding: utf-8 -*-
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
+from multiprocessing import Pool
 import h5py
 import numpy as np
 from phonopy.units import VaspToTHz
 from phonopy.structure.cells import get_primitive
-from upho.phonon.eigenstates import Eigenstates
+from upho.phonon.eigenstates import Eigenstates, write_data_hdf5
 
 __author__ = 'Yuji Ikeda'
 
+# Eigenstates owned by each worker process of the pool
+_eigenstates = None
+
+
+def _initialize_worker(eigenstates_kwargs):
+    global _eigenstates
+    _eigenstates = Eigenstates(**eigenstates_kwargs)
+
+
+def _solve_one_q(args):
+    q, distance = args
+    return extract_data(_eigenstates, q, distance)
+
+
+def extract_data(eigenstates, q, distance):
+    """Extract eigenstates at q and return the data to be written."""
+    eigenstates.set_distance(distance)
+    eigenstates.extract_eigenstates(q)
+    return eigenstates.get_data()
+
 
 class BandStructure(object):
     def __init__(self,
@@ -23,24 +44,38 @@ class BandStructure(object):
                  factor=VaspToTHz,
                  star="none",
                  mode="eigenvector",
+                 nprocs=1,
+                 store_eigenvectors=False,
                  verbose=False):
         """
 
+        Nothing is computed or written until run() is called.
+
         Args:
             dynamical_matrix:
                 Dynamical matrix for the (disordered) supercell.
             primitive_ideal_wrt_unitcell:
                 Primitive cell w.r.t. the unitcell (not the supercell).
+            nprocs:
+                Number of processes to solve q-points on the paths.
+            store_eigenvectors:
+                If True, eigenvectors of all the arms are written to the
+                file. This is independent of is_eigenvectors.
         """
+        if nprocs < 1:
+            raise ValueError('Invalid nprocs {}'.format(nprocs))
+
         # ._dynamical_matrix must be assigned for calculating DOS
         # using the tetrahedron method.
         self._dynamical_matrix = dynamical_matrix
 
-        # self._cell is used for write_yaml and _shift_point.
+        # self._cell is used for _compute_distances.
         # This must correspond to the "ideal" primitive cell.
         primitive_ideal_wrt_unitcell = (
             get_primitive(unitcell_ideal, primitive_matrix_ideal))
         self._cell = primitive_ideal_wrt_unitcell
+        # Reciprocal lattice vectors as rows, used to measure distances.
+        self._reciprocal_lattice = np.linalg.inv(self._cell.get_cell()).T
 
         self._factor = factor
         self._is_eigenvectors = is_eigenvectors
@@ -49,65 +84,144 @@ class BandStructure(object):
             self._is_eigenvectors = True
         self._group_velocity = group_velocity
 
-        self._paths = [np.array(path) for path in paths]
-        self._distances = []
-        self._distance = 0.
-        self._special_point = [0.]
+        self.set_paths(paths)
         self._eigenvalues = None
         self._eigenvectors = None
         self._frequencies = None
 
         self._star = star
         self._mode = mode
-
-        self._eigenstates = Eigenstates(
-            dynamical_matrix,
-            unitcell_ideal,
-            primitive_matrix_ideal,
-            mode=mode,
-            star=star,
-            verbose=verbose)
-
-        with h5py.File('band.hdf5', 'w') as f:
+        self._nprocs = nprocs
+        self._verbose = verbose
+
+        # Eigenstates is rebuilt in each worker process from these arguments.
+        self._eigenstates_kwargs = {
+            'dynamical_matrix': dynamical_matrix,
+            'unitcell_ideal': unitcell_ideal,
+            'primitive_matrix_ideal': primitive_matrix_ideal,
+            'mode': mode,
+            'star': star,
+            'store_eigenvectors': store_eigenvectors,
+            'verbose': verbose,
+        }
+        # Eigenstates is built when it is first needed.
+        self._eigenstates = None
+
+    def set_paths(self, paths):
+        # (npaths, npoints, 3) array; the paths must have the same length.
+        self._paths = np.array(paths, dtype='double')
+        self._distances = self._compute_distances()
+        self._special_point = [0.] + list(self._distances[:, -1])
+
+    def get_paths(self):
+        return self._paths
+
+    def run(self, filename='band.hdf5'):
+        """Solve the q-points on the paths and write them to filename"""
+        # Groups in the file already solved, keyed by the star of q
+        self._solved_groups = {}
+        with h5py.File(filename, 'w') as f:
             self._hdf5_file = f
             self._write_hdf5_header()
-            self._set_band(verbose=verbose)
+            self._set_band(verbose=self._verbose)
+        self._hdf5_file = None
+
+    def _get_eigenstates(self):
+        if self._eigenstates is None:
+            self._eigenstates = Eigenstates(**self._eigenstates_kwargs)
+        return self._eigenstates
 
     def _write_hdf5_header(self):
         self._hdf5_file.create_dataset('paths', data=self._paths)
 
-    def _set_initial_point(self, qpoint):
-        self._lastq = qpoint.copy()
-
-    def _shift_point(self, qpoint):
-        self._distance += np.linalg.norm(
-            np.dot(qpoint - self._lastq,
-                   np.linalg.inv(self._cell.get_cell()).T))
-        self._lastq = qpoint.copy()
-
-    def _set_band(self, verbose=False):
-        for ipath, path in enumerate(self._paths):
-            self._set_initial_point(path[0])
-            self._solve_dm_on_path(ipath, path, verbose)
-
-            self._special_point.append(self._distance)
-
-    def _solve_dm_on_path(self, ipath, path, verbose):
-        eigenstates = self._eigenstates
+    def _compute_distances(self):
+        """Compute distances of the q-points on all the paths
 
-        is_nac = self._dynamical_matrix.is_nac()
+        Each path starts at the distance where the previous path ends.
 
-        for ip, q in enumerate(path):
-            self._shift_point(q)
-
-            if is_nac:
-                raise ValueError('NAC is not implemented yet for unfolding')
-
-            eigenstates.set_distance(self._distance)
-            eigenstates.extract_eigenstates(q)
+        Returns
+        -------
+        distances : (npaths, npoints) array
+        """
+        paths = self._paths
+        steps = np.linalg.norm(
+            np.dot(np.diff(paths, axis=1), self._reciprocal_lattice), axis=-1)
+        distances = np.zeros(paths.shape[:2])
+        distances[:, 1:] = np.cumsum(steps, axis=1)
+        distances[1:] += np.cumsum(distances[:-1, -1])[:, None]
+        return distances
 
+    def _set_band(self, verbose=False):
+        if self._nprocs == 1:
+            self._pool = None
+        else:
+            self._pool = Pool(
+                self._nprocs,
+                initializer=_initialize_worker,
+                initargs=(self._eigenstates_kwargs,))
+        try:
+            for ipath, path in enumerate(self._paths):
+                self._solve_dm_on_path(
+                    ipath, path, self._distances[ipath], verbose)
+        except BaseException:
+            # q-points already queued are discarded instead of being solved.
+            if self._pool is not None:
+                self._pool.terminate()
+            raise
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+    def _solve_dm_on_path(self, ipath, path, distances, verbose):
+        if self._dynamical_matrix.is_nac():
+            raise ValueError('NAC is not implemented yet for unfolding')
+
+        # q-points with the same star as an already solved one are not
+        # solved again; their data are linked to the solved group.
+        eigenstates = self._get_eigenstates()
+        keys = [eigenstates.create_star_key(q) for q in path]
+        keys_found = set(self._solved_groups)
+        is_new = []
+        for key in keys:
+            is_new.append(key not in keys_found)
+            keys_found.add(key)
+        args = [(q, distance)
+                for q, distance, new in zip(path, distances, is_new) if new]
+
+        # q-points are independent of each other and are solved in parallel
+        # if requested. Results are written serially in the order of path.
+        if self._pool is None:
+            data_new = (
+                extract_data(eigenstates, q, distance)
+                for q, distance in args)
+        else:
+            data_new = self._pool.imap(_solve_one_q, args)
+
+        for ip, (q, distance) in enumerate(zip(path, distances)):
             group = '{}/{}/'.format(ipath, ip)
-            eigenstates.write_hdf5(self._hdf5_file, group=group)
+            if is_new[ip]:
+                data = next(data_new)
+                write_data_hdf5(self._hdf5_file, data, group=group)
+                self._solved_groups[keys[ip]] = group
+            else:
+                self._link_solved_group(
+                    self._solved_groups[keys[ip]], group, q, distance)
+
+    def _link_solved_group(self, group_solved, group, q, distance):
+        """Link datasets of a solved group except 'point' and 'distance'
+
+        'q_star' is linked together with the data over the arms, so the
+        arms keep the order of the solved group.
+        """
+        hdf5_file = self._hdf5_file
+        for k in hdf5_file[group_solved]:
+            if k in ('point', 'distance'):
+                continue
+            hdf5_file[group + k] = hdf5_file[group_solved + k]
+        data = {'point': q, 'distance': distance}
+        write_data_hdf5(hdf5_file, data, group=group)
 
     def get_unitcell_orig(self):
         unitcell_orig = self._dynamical_matrix.get_primitive()
@@ -4,6 +4,7 @@ from __future__ import absolute_import, print_function, unicode_literals
 import h5py
 import numpy as np
 from upho.analysis.smearing import Smearing, create_points
+from upho.file_io import decode_string
 
 
 __author__ = "Yuji Ikeda"
@@ -76,11 +77,27 @@ class DensityExtractor(object):
         return frequencies
 
     def calculate_spectral_functions(self, frequencies, weights, is_SR_E1=True):
+        """
+
+        The smearing kernel of each arm is created once and shared among
+        all the kinds of weights.
+
+        Parameters
+        ----------
+        frequencies : (num_arms, nbands) array
+        weights : Dictionary of (num_arms, ... , nbands) arrays
+        """
+        keys = [k for k in weights if not (k == 'SR_E1' and not is_SR_E1)]
+
         spectral_functions = {}
-        for k, v in weights.items():
-            if k == 'SR_E1' and not is_SR_E1:
-                continue
-            spectral_functions[k] = self.calculate_density(frequencies, v)
+        for i, f in enumerate(frequencies):  # Sum over arms
+            kernel = self._smearing.create_kernel(f)
+            for k in keys:
+                density = np.inner(kernel, weights[k][i])
+                if i == 0:
+                    spectral_functions[k] = density
+                else:
+                    spectral_functions[k] += density
         return spectral_functions
 
     def calculate_density(self, frequencies, weights):
@@ -91,10 +108,12 @@ class DensityExtractor(object):
         frequencies : (num_arms, nbands) array
         weights : (num_arms, ... , nbands) array
         """
-        density_data = []
-        for f, w in zip(frequencies, weights):
-            density_data.append(self._smearing.run(f, w))
-        density_data = np.sum(density_data, axis=0)  # Sum over arms
+        density_data = None
+        for f, w in zip(frequencies, weights):  # Sum over arms
+            if density_data is None:
+                density_data = self._smearing.run(f, w)
+            else:
+                density_data += self._smearing.run(f, w)
         return density_data
 
     def _create_atom_weights(self, weights, vectors, ndim=3):
@@ -168,9 +187,7 @@ class DensityExtractorHDF5(DensityExtractor):
         ]
 
         for k in keys:
-            file_out.create_dataset(
-                group + k, data=np.array(self._band_data[group + k])
-            )
+            self._band_data.copy(group + k, file_out, name=group + k)
         file_out.create_dataset(group + 'total_sf'      , data=spectral_functions['total'])
         file_out.create_dataset(group + 'partial_sf_e'  , data=spectral_functions['E1'   ])
         file_out.create_dataset(group + 'partial_sf_s'  , data=spectral_functions['SR'   ])
@@ -202,7 +219,11 @@ class DensityExtractorText(DensityExtractor):
         fn_irreps = 'sf_SR.dat'
         fn_e1     = 'sf_E1.dat'
         fn_e2     = 'sf_E2.dat'
-        with open(fn_irreps, 'w') as fi, open(fn_e1, 'w') as fe, open(fn_e2, 'w') as fe2:
+        # Binary files with large buffers; text is encoded block by block.
+        buffering = 1 << 20
+        with open(fn_irreps, 'wb', buffering) as fi, \
+                open(fn_e1, 'wb', buffering) as fe, \
+                open(fn_e2, 'wb', buffering) as fe2:
             self._print_header(fi)
             self._print_header(fe)
             self._print_header(fe2)
@@ -234,97 +255,86 @@ class DensityExtractorText(DensityExtractor):
         self._write_e2    (fe2, group, distance, spectral_functions)
 
     def _write_irreps(self, file_out, group, distance, sf):
-        ir_labels = [x.decode('ascii') for x in self._band_data[group + 'ir_labels']]
+        ir_labels = [decode_string(x) for x in self._band_data[group + 'ir_labels']]
 
-        file_out.write('# {:10s}'.format('Dist.'))
-        file_out.write('{:12s}'.format('Freq. (THz)'))
-        file_out.write('{:12s}'.format('Total'))
-        for ir_label in ir_labels:
-            file_out.write('{:12s}'.format(ir_label))
-        file_out.write('\n')
+        self._write_labels(file_out, ir_labels)
 
-        frequencies = self._evaluated_energies
-        sf_total   = sf['total']
-        sf_partial = sf['SR']
-
-        for i, frequency in enumerate(frequencies):
-            file_out.write('{:12.6f}'.format(distance))
-            file_out.write('{:12.6f}'.format(frequency))
-            file_out.write('{:12.6f}'.format(sf_total[i]))
-            for v in sf_partial[i, :]:
-                file_out.write('{:12.6f}'.format(v))
-            file_out.write('\n')
-        file_out.write('\n')
+        self._write_values(file_out, distance, sf['total'], sf['SR'])
 
     def _write_e1(self, file_out, group, distance, sf):
         elements = self._get_elements(group)
         ne = len(elements)
 
-        file_out.write('# {:10s}'.format('Dist.'))
-        file_out.write('{:12s}'.format('Freq. (THz)'))
-        file_out.write('{:12s}'.format('Total'))
+        labels = []
         for ie in range(ne):
             for je in range(ie, ne):
-                label = elements[ie] + '-' + elements[je]
-                file_out.write('{:12s}'.format(label))
-        file_out.write('\n')
+                labels.append(elements[ie] + '-' + elements[je])
+        self._write_labels(file_out, labels)
 
-        frequencies = self._evaluated_energies
-        sf_total   = sf['total']
-        sf_partial = sf['E1']
-
-        for i, frequency in enumerate(frequencies):
-            file_out.write('{:12.6f}'.format(distance))
-            file_out.write('{:12.6f}'.format(frequency))
-            file_out.write('{:12.6f}'.format(sf_total[i]))
-            for ie in range(ne):
-                for je in range(ie, ne):
-                    if ie == je:
-                        v = np.real(np.sum(sf_partial[i, :, ie, :, je]))
-                    else:
-                        v = np.real(
-                            np.sum(sf_partial[i, :, ie, :, je]) +
-                            np.sum(sf_partial[i, :, je, :, ie])
-                        )
-                    file_out.write('{:12.6f}'.format(float(v)))
-            file_out.write('\n')
-        file_out.write('\n')
+        # (nfrequencies, nelms, nelms) after summing over atoms
+        sf_elements = np.real(np.sum(sf['E1'], axis=(1, 3)))
+
+        # Off-diagonal pairs include both (ie, je) and (je, ie).
+        sf_pairs = sf_elements + np.swapaxes(sf_elements, 1, 2)
+        indices = np.arange(ne)
+        sf_pairs[:, indices, indices] = sf_elements[:, indices, indices]
+
+        upper = np.triu_indices(ne)
+        values = sf_pairs[:, upper[0], upper[1]]
+
+        self._write_values(file_out, distance, sf['total'], values)
 
     def _write_e2(self, file_out, group, distance, sf):
         elements = self._get_elements(group)
-        ne = len(elements)
 
-        file_out.write('# {:10s}'.format('Dist.'))
-        file_out.write('{:12s}'.format('Freq. (THz)'))
-        file_out.write('{:12s}'.format('Total'))
-        for ie in range(ne):
-            label = elements[ie]
-            file_out.write('{:12s}'.format(label))
-        file_out.write('\n')
+        self._write_labels(file_out, elements)
+
+        values = np.sum(sf['E2'], axis=1)
+
+        self._write_values(file_out, distance, sf['total'], values)
+
+    def _write_labels(self, file_out, labels):
+        line = '# {:10s}'.format('Dist.')
+        line += '{:12s}'.format('Freq. (THz)')
+        line += '{:12s}'.format('Total')
+        for label in labels:
+            line += '{:12s}'.format(label)
+        line += '\n'
+        file_out.write(line.encode('ascii'))
 
+    def _write_values(self, file_out, distance, sf_total, sf_partial):
+        """Write a block of spectral functions at once
+
+        Parameters
+        ----------
+        distance : Float
+        sf_total : (nfrequencies) array
+        sf_partial : (nfrequencies, ncolumns) array
+        """
         frequencies = self._evaluated_energies
-        sf_total   = sf['total']
-        sf_partial = sf['E2']
-
-        for i, frequency in enumerate(frequencies):
-            file_out.write('{:12.6f}'.format(distance))
-            file_out.write('{:12.6f}'.format(frequency))
-            file_out.write('{:12.6f}'.format(sf_total[i]))
-            for ie in range(ne):
-                v = np.sum(sf_partial[i, :, ie])
-                file_out.write('{:12.6f}'.format(float(v)))
-            file_out.write('\n')
-        file_out.write('\n')
+        nfrequencies = len(frequencies)
+
+        data = np.column_stack((
+            np.full(nfrequencies, distance),
+            frequencies,
+            sf_total,
+            np.reshape(sf_partial, (nfrequencies, -1)),
+        ))
+
+        line_format = '%12.6f' * data.shape[1] + '\n'
+        text = (line_format * nfrequencies) % tuple(data.ravel()) + '\n'
+        file_out.write(text.encode('ascii'))
 
     def _print_header(self, file_output):
         function_name = self._smearing.get_function_name()
         sigma         = self._smearing.get_sigma()
         is_squared = self._is_squared
 
-        file_output.write('# function: {}\n'.format(function_name))
-        file_output.write('# sigma: {}\n'.format(sigma))  # For THz^2 or THz
-        file_output.write('# is_squared: {}\n'.format(is_squared))
-        file_output.write('#\n')
+        text = '# function: {}\n'.format(function_name)
+        text += '# sigma: {}\n'.format(sigma)  # For THz^2 or THz
+        text += '# is_squared: {}\n'.format(is_squared)
+        text += '#\n'
+        file_output.write(text.encode('ascii'))
 
     def _get_elements(self, group):
-        return [x.decode('ascii') for x in self._band_data[group + 'elements']]
+        return [decode_string(x) for x in self._band_data[group + 'elements']]
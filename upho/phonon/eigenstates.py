@@ -1,3 +1,4 @@
+import h5py
 import numpy as np
 from phonopy.structure.cells import get_primitive
 from phonopy.units import VaspToTHz
@@ -18,9 +19,20 @@ class Eigenstates(object):
                  star="none",
                  mode="eigenvector",
                  factor=VaspToTHz,
+                 store_eigenvectors=False,
                  verbose=False):
+        """
+
+        Parameters
+        ----------
+        store_eigenvectors : Bool
+            If True, eigenvectors of all the arms are kept and written.
+            Otherwise they are released right after the weights are
+            calculated.
+        """
         self._verbose = verbose
         self._mode = mode
+        self._store_eigenvectors = store_eigenvectors
 
         self._factor = factor
 
@@ -39,6 +51,11 @@ class Eigenstates(object):
         self._create_rotational_projector()
         self._build_element_weights_calculator()
 
+        # Eigensolutions reused by later arms of the present star, keyed by
+        # q_sc, and the numbers of the remaining reuses
+        self._eigensolutions = {}
+        self._num_reuses = {}
+
     def _build_element_weights_calculator(self):
         unitcell_orig   = self._cell
         primitive_ideal = self._primitive
@@ -99,6 +116,26 @@ class Eigenstates(object):
 
         return q_star, transformation_matrices
 
+    def create_star_key(self, q, decimals=10):
+        """Create a hashable key identifying the star of q
+
+        Unfolded data depend only on the arms of the star. q-points sharing
+        the same arms (e.g. q and Rq for "sym" and "all", or identical
+        q-points at the junctions of band paths) give the same key.
+
+        Parameters
+        ----------
+        q : Reciprocal space point in fractional coordinates for "PC".
+        decimals : Integer
+            Number of decimals to which the arms are rounded.
+        """
+        if self._star == "none":
+            q_star = np.array(q)[None, :]
+        else:  # "all" or "sym"
+            q_star = self._star_creator.create_star(q)[0]
+        q_star = np.round(q_star, decimals)
+        return tuple(sorted(tuple(arm) for arm in q_star))
+
     def extract_eigenstates(self, q):
         """
 
@@ -124,27 +161,45 @@ class Eigenstates(object):
 
         q_star, transformation_matrices = self.create_q_star(q)
 
-        eigvals_arms = []  # (num_arms, nbands)
+        num_arms = len(q_star)
+
+        self._eigensolutions = {}
+        self._num_reuses = self._count_reuses(q_star)
+
+        # Arrays over arms are allocated once the first arm gives the shapes.
+        eigvals_arms = None  # (num_arms, nbands)
+        eigvecs_arms = None  # (num_arms, nbands, nbands)
 
         weights_arms = {}
         weights_keys = ['total', 'SR', 'E1', 'SR_E1', 'E2']
-        for k in weights_keys:
-            weights_arms[k] = []
 
-        for i_star, (q, transformation_matrix) in enumerate(zip(q_star, transformation_matrices)):
+        for i_star, (q_pc, transformation_matrix) in enumerate(zip(q_star, transformation_matrices)):
             print("i_star:", i_star)
-            print("q_pc:", q)
+            print("q_pc:", q_pc)
             eigvals, eigvecs, weights = self._extract_eigenstates_for_q(
-                q, transformation_matrix)
-
-            eigvals_arms.append(eigvals)
+                q_pc, transformation_matrix)
+
+            if i_star == 0:
+                eigvals_arms = np.empty(
+                    (num_arms,) + eigvals.shape, dtype=eigvals.dtype)
+                if self._store_eigenvectors:
+                    eigvecs_arms = np.empty(
+                        (num_arms,) + eigvecs.shape, dtype=eigvecs.dtype)
+                for k in weights_keys:
+                    w = np.asarray(weights[k])
+                    weights_arms[k] = np.empty(
+                        (num_arms,) + w.shape, dtype=w.dtype)
+
+            eigvals_arms[i_star] = eigvals
+            if self._store_eigenvectors:
+                eigvecs_arms[i_star] = eigvecs
             for k in weights_keys:
-                weights_arms[k].append(weights[k])
+                weights_arms[k][i_star] = weights[k]
 
-        frequencies_arms = calculate_frequencies(np.array(eigvals_arms), self._factor)
+        frequencies_arms = calculate_frequencies(eigvals_arms, self._factor)
 
         for k in weights_keys:
-            weights_arms[k] = np.array(weights_arms[k]) / len(q_star)
+            weights_arms[k] /= num_arms
 
         for k in weights_keys:
             print("Sum of weights_arms {:5s} :".format(k), np.nansum(weights_arms[k]))
@@ -153,6 +208,7 @@ class Eigenstates(object):
         self._point = q
 
         self._frequencies_arms     = frequencies_arms
+        self._eigenvectors_arms = eigvecs_arms
         self._weights_arms = weights_arms
 
     def get_point(self):
@@ -161,12 +217,14 @@ class Eigenstates(object):
     def get_frequencies_arms(self):
         return self._frequencies_arms
 
+    def get_eigenvectors_arms(self):
+        return self._eigenvectors_arms
+
     def get_narms(self):
         return len(self._q_star)
 
     def get_pointgroup_symbol(self):
-        return np.array(
-            self._rotational_projector.get_pointgroup_symbol(), dtype='S')
+        return self._rotational_projector.get_pointgroup_symbol()
 
     # def get_ir_labels(self):
     #     rotational_projector = self._rotational_projector
@@ -178,8 +236,7 @@ class Eigenstates(object):
     #     return ir_labels
 
     def get_ir_labels(self):
-        return np.array(
-            self._rotational_projector.get_ir_labels(), dtype='S')
+        return list(self._rotational_projector.get_ir_labels())
 
     def get_num_irreps(self):
         return self._rotational_projector.get_num_irs()
@@ -204,10 +261,7 @@ class Eigenstates(object):
 
         print("q_sc:", q_sc)
 
-        self._dynamical_matrix.set_dynamical_matrix(q_sc)
-        dm = self._dynamical_matrix.get_dynamical_matrix()
-        with TimeMeasurer('Solve eigenproblem'):
-            eigvals, eigvecs = np.linalg.eigh(dm)
+        eigvals, eigvecs = self._solve_eigenproblem(q_sc)
 
         weights = {}
 
@@ -236,6 +290,79 @@ class Eigenstates(object):
 
         return eigvals, eigvecs, weights
 
+    def _count_reuses(self, q_star):
+        """Count how many times the eigensolution of each arm is reused
+
+        Arms of the star at the same q_sc, which appear for star="all",
+        share the solution. Since force constants are real,
+        D(-q) = D(q)^*, and arms at -q_sc also share it.
+
+        Parameters
+        ----------
+        q_star : (num_arms, 3) array
+            Arms of the star in fractional coordinates for PC.
+
+        Returns
+        -------
+        num_reuses : Dictionary
+            Numbers of reuses keyed by q_sc of the arm solved first. Arms
+            not reused later are not included.
+        """
+        primitive_matrix = self._primitive.get_primitive_matrix()
+        num_reuses = {}
+        for q_pc in q_star:
+            q_sc = get_q_sc_from_q_pc(q_pc, primitive_matrix)
+            key = create_q_key(q_sc)
+            key_tr = create_q_key(-q_sc)
+            if key in num_reuses:
+                num_reuses[key] += 1
+            elif key_tr in num_reuses:
+                num_reuses[key_tr] += 1
+            else:
+                num_reuses[key] = 0
+        return {k: v for k, v in num_reuses.items() if v > 0}
+
+    def _solve_eigenproblem(self, q_sc):
+        """Solve the eigenproblem of the dynamical matrix at q_sc
+
+        Only solutions reused by later arms of the star are kept (see
+        _count_reuses), and each is dropped after its last reuse. Arms at
+        -q_sc reuse the eigenvalues and the complex-conjugated eigenvectors.
+
+        Parameters
+        ----------
+        q_sc : Reciprocal space point in fractional coordinates for SC.
+        """
+        key = create_q_key(q_sc)
+        if key in self._eigensolutions:
+            print("Eigensolution is reused.")
+            return self._reuse_eigensolution(key)
+
+        key_tr = create_q_key(-q_sc)
+        if key_tr in self._eigensolutions:
+            print("Eigensolution at -q is reused (time reversal).")
+            eigvals, eigvecs = self._reuse_eigensolution(key_tr)
+            return eigvals, eigvecs.conj()
+
+        self._dynamical_matrix.set_dynamical_matrix(q_sc)
+        dm = self._dynamical_matrix.get_dynamical_matrix()
+        # eigh reads only one triangle; remove the non-Hermitian roundoff
+        # so that both triangles contribute.
+        dm = 0.5 * (dm + dm.conj().T)
+        with TimeMeasurer('Solve eigenproblem'):
+            eigvals, eigvecs = np.linalg.eigh(dm)
+
+        if key in self._num_reuses:
+            self._eigensolutions[key] = eigvals, eigvecs
+        return eigvals, eigvecs
+
+    def _reuse_eigensolution(self, key):
+        self._num_reuses[key] -= 1
+        if self._num_reuses[key] == 0:
+            del self._num_reuses[key]
+            return self._eigensolutions.pop(key)
+        return self._eigensolutions[key]
+
     def _extract_weights(self, q, eigvecs):
         """Extract weights.
 
@@ -375,17 +502,15 @@ class Eigenstates(object):
         self._distance = distance
 
     def get_reduced_elements(self):
-        return np.array(
-            self._element_weights_calculator.get_reduced_elements(), dtype='S')
+        return list(self._element_weights_calculator.get_reduced_elements())
 
-    def write_hdf5(self, hdf5_file, group=''):
-        """
+    def get_data(self):
+        """Get data for the present q-point
 
-        Parameters
-        ----------
-        hdf5_file : HDF5 file object
-        group : String
-            Indices for the present q-point.
+        Returns
+        -------
+        data_dict : Dictionary
+            Keys are the names of the datasets written in HDF5.
         """
         natoms_primitive = self._cell.get_number_of_atoms()
 
@@ -406,12 +531,65 @@ class Eigenstates(object):
             'weights_s_e'      : self._weights_arms['SR_E1'],
             'weights_e2'       : self._weights_arms['E2'   ],
         }
+        if self._store_eigenvectors:
+            data_dict['eigenvectors'] = self.get_eigenvectors_arms()
+        return data_dict
 
-        for k, v in data_dict.items():
+    def write_hdf5(self, hdf5_file, group=''):
+        """
+
+        Parameters
+        ----------
+        hdf5_file : HDF5 file object
+        group : String
+            Indices for the present q-point.
+        """
+        write_data_hdf5(hdf5_file, self.get_data(), group=group)
+
+
+def write_data_hdf5(hdf5_file, data_dict, group='', compression_threshold=65536):
+    """Write data for a q-point
+
+    Frequencies and weights are written with explicit dtypes. Those larger
+    than compression_threshold bytes (typically weights resolved by
+    elements) are chunked and compressed; chunking smaller ones costs more
+    than it saves. Strings and lists of strings (elements, labels) are
+    written as variable-length strings.
+    """
+    for k, v in data_dict.items():
+        if is_string_data(v):
+            hdf5_file.create_dataset(
+                group + k, data=v, dtype=h5py.string_dtype())
+            continue
+        v = np.asarray(v)
+        if v.dtype.kind not in 'fc':
             hdf5_file.create_dataset(group + k, data=v)
+            continue
+        dtype = 'complex128' if v.dtype.kind == 'c' else 'double'
+        if v.nbytes > compression_threshold:
+            hdf5_file.create_dataset(
+                group + k, data=v, dtype=dtype,
+                chunks=True, compression='gzip')
+        else:
+            hdf5_file.create_dataset(group + k, data=v, dtype=dtype)
+
+
+def is_string_data(value):
+    if isinstance(value, str):
+        return True
+    if isinstance(value, list):
+        return all(isinstance(x, str) for x in value)
+    return False
+
 
 def calculate_frequencies(eigenvalues, factor):
-    frequencies = np.sqrt(np.abs(eigenvalues)) * np.sign(eigenvalues)
+    """Calculate frequencies from eigenvalues of any shape at once
+
+    Negative eigenvalues give negative (imaginary) frequencies.
+    Operations are done in place on a single output array.
+    """
+    frequencies = np.sqrt(np.abs(eigenvalues))
+    np.copysign(frequencies, eigenvalues, out=frequencies)
     frequencies *= factor
     return frequencies
 
@@ -434,6 +612,11 @@ def get_displacements_from_eigvecs(eigvecs, supercell, q):
     return displacements
 
 
+def create_q_key(q, decimals=10):
+    """Create a hashable key for a reciprocal space point"""
+    return tuple(np.round(q, decimals))
+
+
 def get_q_sc_from_q_pc(q_pc, primitive_matrix):
     q_sc = np.dot(q_pc, np.linalg.inv(primitive_matrix))
     # For the current implementation, we should "not" wrap q_sc into the cell
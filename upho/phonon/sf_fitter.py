@@ -7,6 +7,7 @@ import numpy as np
 from scipy.optimize import curve_fit
 from upho.analysis.functions import FittingFunctionFactory
 from upho.irreps.irreps import extract_degeneracy_from_ir_label
+from upho.file_io import decode_string
 
 __author__ = 'Yuji Ikeda'
 
@@ -73,7 +74,7 @@ class SFFitter(object):
                 if self._is_squared:
                     norm = self._create_initial_norm(frequencies, sf)
                 else:
-                    ir_label = str(point_data['ir_labels'][i], encoding='ascii')
+                    ir_label = decode_string(point_data['ir_labels'][i])
                     norm = float(extract_degeneracy_from_ir_label(ir_label))
 
                 def f(x, p, w):
@@ -141,9 +142,7 @@ class SFFitter(object):
         ]
 
         for k in keys:
-            file_out.create_dataset(
-                group_name + k, data=np.array(self._band_data[group_name + k])
-            )
+            self._band_data.copy(group_name + k, file_out, name=group_name + k)
         group.create_dataset('peaks_s', data=peak_positions_s)
         group.create_dataset('widths_s', data=widths_s)
         group.create_dataset('norms_s', data=norms_s)